@@ -1,3 +1,4 @@
 from .indexable import LazyDictionary
 from .property import CachedProperty
-from .file_call import FileCached, file_cached_decorator
+from .file_call import FileCached, AsyncFileCached, file_cached_decorator
+from .keys import make_key
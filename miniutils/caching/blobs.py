@@ -0,0 +1,72 @@
+import mmap
+import os
+import tempfile
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: nocover
+    np = None
+
+# Stands in for a large result in a cache entry; the result itself is kept in the named file in the blob directory
+Blob = namedtuple('Blob', ('filename', 'kind'))
+
+_EXTENSIONS = {'ndarray': '.npy', 'bytes': '.bin'}
+
+
+def _nbytes(value):
+    if isinstance(value, (bytes, bytearray)):
+        return 'bytes', len(value)
+    if np is not None and type(value) is np.ndarray and not value.dtype.hasobject:
+        return 'ndarray', value.nbytes
+    return None, 0
+
+
+def save_blob(directory, key, value, threshold):
+    """Writes ``value`` to its own file if it's a large enough array or bytes object
+
+    :param directory: The directory in which to keep blob files
+    :param key: The key of the cache entry holding this value
+    :param value: The value to store
+    :param threshold: The minimum size in bytes of values which are written to their own file
+    :return: A :class:`Blob` to store in place of ``value``, or ``None`` if it should be stored as usual
+    """
+    kind, nbytes = _nbytes(value)
+    if kind is None or nbytes < max(threshold, 1):
+        return None
+
+    os.makedirs(directory, exist_ok=True)
+    filename = key + _EXTENSIONS[kind]
+    # Write to a temporary file and move it into place, so that readers never map a partially written file
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if kind == 'ndarray':
+                np.save(f, value, allow_pickle=False)
+            else:
+                f.write(value)
+        os.replace(tmp_path, os.path.join(directory, filename))
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return Blob(filename, kind)
+
+
+def load_blob(directory, blob):
+    """Maps a blob file into memory as a read-only view, raising ``FileNotFoundError`` if it's gone
+
+    :return: A read-only, memory-mapped ``numpy.ndarray`` or ``memoryview``
+    """
+    path = os.path.join(directory, blob.filename)
+    if blob.kind == 'ndarray':
+        return np.load(path, mmap_mode='r', allow_pickle=False)
+    with open(path, 'rb') as f:
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def delete_blobs(directory, key):
+    for extension in _EXTENSIONS.values():
+        try:
+            os.remove(os.path.join(directory, key + extension))
+        except FileNotFoundError:
+            pass
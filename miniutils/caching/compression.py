@@ -0,0 +1,55 @@
+import bz2
+import lzma
+import zlib
+
+# Values are pickles, which always start with the PROTO opcode; compressed values start with their codec's name instead
+_PICKLE_PREFIX = b'\x80'
+_SEPARATOR = b'\0'
+
+CODECS = {
+    'zlib': (zlib.compress, zlib.decompress),
+    'lzma': (lzma.compress, lzma.decompress),
+    'bz2': (bz2.compress, bz2.decompress),
+}
+
+
+def register_codec(name, compress, decompress):
+    """Makes a compression codec available to :class:`miniutils.caching.FileCached` under ``name``
+
+    The name is stored with every value compressed by the codec, so it must stay registered (under the same name) for
+    as long as such values remain in any cache.
+
+    :param name: An ASCII name for the codec, such as ``'zstd'``
+    :param compress: A function compressing ``bytes`` to ``bytes``
+    :param decompress: The inverse of ``compress``
+    """
+    encoded = name.encode('ascii')
+    if not encoded or _SEPARATOR in encoded or encoded.startswith(_PICKLE_PREFIX):
+        raise ValueError("Invalid codec name '{}'".format(name))
+    CODECS[name] = (compress, decompress)
+
+
+def compress(data, codec, threshold=0):
+    """Compresses a pickled value with ``codec``, unless it's smaller than ``threshold`` bytes or ``codec`` is ``None``
+
+    The codec's name is prepended to the result, so that :func:`decompress` doesn't need to know which was used.
+    """
+    if codec is None or len(data) < threshold:
+        return data
+    try:
+        compress_fn, _ = CODECS[codec]
+    except KeyError:
+        raise ValueError("Unknown compression codec '{}', expected one of {}".format(codec, sorted(CODECS)))
+    return codec.encode('ascii') + _SEPARATOR + compress_fn(data)
+
+
+def decompress(data):
+    """Gets back the pickled value from the output of :func:`compress`, whichever codec (if any) was used"""
+    if data[:1] == _PICKLE_PREFIX:
+        return data
+    name, _, payload = data.partition(_SEPARATOR)
+    try:
+        _, decompress_fn = CODECS[name.decode('ascii')]
+    except KeyError:
+        raise ValueError("Cache entry was compressed with unknown codec '{}'".format(name.decode('ascii', 'replace')))
+    return decompress_fn(payload)
@@ -0,0 +1,163 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+import warnings
+
+# inotify event flags, from <sys/inotify.h>
+_IN_MODIFY = 0x2
+_IN_ATTRIB = 0x4
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_DELETE_SELF = 0x400
+_IN_MOVE_SELF = 0x800
+_IN_Q_OVERFLOW = 0x4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = (_IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE |
+               _IN_DELETE_SELF | _IN_MOVE_SELF)
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+class _InotifyWatcher:
+    """Watches the directories containing a set of files, and flags when any of those files might have changed
+
+    Directories are watched rather than the files themselves so that files which are replaced (e.g., by an atomic
+    rename) or created later are still noticed. Events are read by a daemon thread, so checking the flag is free.
+    """
+
+    def __init__(self, files):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = libc.inotify_init1(_IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self._names = {}
+        for file in files:
+            directory, name = os.path.split(file)
+            wd = libc.inotify_add_watch(self._fd, os.fsencode(directory), _WATCH_MASK)
+            if wd < 0:
+                os.close(self._fd)
+                raise OSError(ctypes.get_errno(), "Failed to watch {}".format(directory))
+            self._names.setdefault(wd, set()).add(os.fsencode(name))
+
+        # Start dirty, so the first check stats the files
+        self.changed = True
+        self._wake_read, self._wake_write = os.pipe()
+        self._thread = threading.Thread(target=self._watch, name='inotify watcher', daemon=True)
+        self._thread.start()
+
+    def _watch(self):
+        poller = select.poll()
+        poller.register(self._fd, select.POLLIN)
+        poller.register(self._wake_read, select.POLLIN)
+        while True:
+            ready = [fd for fd, _ in poller.poll()]
+            if self._wake_read in ready:
+                break
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except InterruptedError:
+                continue
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if mask & (_IN_Q_OVERFLOW | _IN_DELETE_SELF | _IN_MOVE_SELF) or name in self._names.get(wd, ()):
+                    self.changed = True
+
+    def close(self):
+        if self._thread is not None:
+            os.write(self._wake_write, b'\0')
+            self._thread.join()
+            self._thread = None
+            for fd in (self._fd, self._wake_read, self._wake_write):
+                os.close(fd)
+
+
+class FileDependencies:
+    def __init__(self, files, check_interval=0, watch=False):
+        """Tracks the modification times of a set of files, with as few system calls as possible
+
+        :param files: The absolute paths of the files
+        :param check_interval: For how many seconds a set of modification times can be reused before re-checking
+        :param watch: If True, use inotify (Linux only) to only re-check the files after one of them might have changed;
+         falls back to ``check_interval`` elsewhere
+        """
+        self.files = tuple(files)
+        self.check_interval = check_interval
+        self.watch = watch
+        self._mtimes = None
+        self._checked = 0
+        self._watcher = None
+        self._pid = os.getpid()
+        if watch and self.files:
+            if sys.platform.startswith('linux'):
+                try:
+                    self._watcher = _InotifyWatcher(self.files)
+                except (OSError, AttributeError) as ex:
+                    warnings.warn("Unable to watch dependency files, falling back to polling: {}".format(ex))
+            else:
+                warnings.warn("Watching dependency files is only supported on Linux, falling back to polling")
+
+    def __getstate__(self):
+        return {'files': self.files, 'check_interval': self.check_interval, 'watch': self.watch}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _stat(self):
+        mtimes = {}
+        for file in self.files:
+            try:
+                mtimes[file] = os.stat(file).st_mtime
+            except FileNotFoundError:
+                mtimes[file] = None
+        return mtimes
+
+    def mtimes(self, force=False):
+        """Gets the modification time of each file (``None`` for missing files), as a dictionary
+
+        :param force: If True, check the files even if a recent result is available
+        """
+        if not self.files:
+            return {}
+        watcher = self._watcher
+        if watcher is not None and self._pid != os.getpid():
+            # The watcher's thread didn't survive a fork, so start a new one for this process
+            self.__init__(self.files, self.check_interval, self.watch)
+            watcher = self._watcher
+        if watcher is not None:
+            if force or watcher.changed:
+                # Clear the flag before checking, so that a change during the check isn't lost
+                watcher.changed = False
+                self._mtimes = self._stat()
+        elif force or self._mtimes is None or time.monotonic() - self._checked >= self.check_interval:
+            self._checked = time.monotonic()
+            self._mtimes = self._stat()
+        return self._mtimes
+
+    def unchanged_since(self, mtimes):
+        """Checks that every file exists and hasn't been modified since the given modification times"""
+        current = self.mtimes()
+        for file in self.files:
+            modified = current[file]
+            if modified is None or modified > mtimes[file]:
+                return False
+        return True
+
+    def close(self):
+        if self._watcher is not None and self._pid == os.getpid():
+            self._watcher.close()
+        self._watcher = None
+
+    def __del__(self):
+        self.close()
@@ -0,0 +1,67 @@
+def _lru(entry):
+    return entry.accessed
+
+
+def _lfu(entry):
+    return entry.hits, entry.accessed
+
+
+def _cost(entry):
+    # Seconds of computation saved per byte kept, counting the computation that created the entry
+    return (entry.hits + 1) * entry.cost / max(entry.size, 1), entry.accessed
+
+
+POLICIES = {
+    'lru': _lru,
+    'lfu': _lfu,
+    'cost': _cost,
+}
+
+
+def get_policy(policy):
+    """Gets the eviction policy named by ``policy`` (a key of ``POLICIES``), or ``policy`` itself if it's callable
+
+    A policy maps an :class:`miniutils.caching.storage.EntryInfo` to a sort key; entries with the smallest keys are
+    evicted first.
+    """
+    if callable(policy):
+        return policy
+    try:
+        return POLICIES[policy]
+    except KeyError:
+        raise ValueError("Unknown eviction policy '{}', expected one of {}".format(policy, sorted(POLICIES)))
+
+
+def select_victims(entries, policy, max_entries=None, max_bytes=None, headroom=0.1):
+    """Chooses which entries to evict to bring a cache within its limits
+
+    To avoid evicting on every subsequent write, enough entries are chosen to get ``headroom`` (as a fraction of each
+    limit) below the limits.
+
+    :param entries: The :class:`miniutils.caching.storage.EntryInfo` of every entry in the cache
+    :param policy: A function giving the sort key of an entry; the smallest are evicted first
+    :param max_entries: The maximum number of entries to keep
+    :param max_bytes: The maximum total size of entries to keep
+    :param headroom: The fraction of each limit to free up beyond the limit itself
+    :return: The keys of the entries to evict
+    """
+    entries = list(entries)
+    count = len(entries)
+    size = sum(entry.size for entry in entries)
+    target_count = None if max_entries is None else int(max_entries * (1 - headroom))
+    target_size = None if max_bytes is None else max_bytes * (1 - headroom)
+
+    def over():
+        return (target_count is not None and count > target_count) or (target_size is not None and size > target_size)
+
+    victims = []
+    if not over():
+        return victims
+
+    for entry in sorted(entries, key=policy):
+        victims.append(entry.key)
+        count -= 1
+        size -= entry.size
+        if not over():
+            break
+    return victims
@@ -1,15 +1,92 @@
+import asyncio
+import inspect
 import os
-import shelve
-from collections import namedtuple
-from functools import wraps
+import pickle
+import shutil
+import threading
+import time
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps, partial
 from glob import glob
 
 from miniutils.opt_decorator import optional_argument_decorator
 from miniutils.logs_base import debug
+from miniutils.progress_bar import parallel_progbar
+from .blobs import Blob, save_blob, load_blob, delete_blobs
+from .compression import CODECS, compress, decompress
+from .dependencies import FileDependencies
+from .eviction import get_policy, select_victims
+from .keys import make_key, code_fingerprint
+from .locks import FileKeyLocks
+from .storage import LockedStorage, open_storage
+from .writer import WriteBehind
+
+def _timed_call(fn, args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+CacheInfo = namedtuple('CacheInfo', ('hits', 'misses', 'memory_hits', 'memory_misses'))
+
+
+class _MemoryTier:
+    """A thread-safe LRU mapping of cache keys to entry records, bounded by entry count and/or by the total pickled
+    size of the records"""
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries[key]
+            self._entries.move_to_end(key)
+        return entry[0]
+
+    def set(self, key, record, nbytes):
+        if self.max_bytes is not None and nbytes > self.max_bytes:
+            return
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (record, nbytes)
+            self._bytes += nbytes
+            while ((self.max_entries is not None and len(self._entries) > self.max_entries) or
+                   (self.max_bytes is not None and self._bytes > self.max_bytes)):
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self._bytes -= evicted_bytes
+
+    def discard(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
 
 
 class FileCached:
-    def __init__(self, fn, cache_path=None, files_used=None, auto_purge=False):
+    def __new__(cls, fn=None, *args, **kwargs):
+        # Coroutine functions need their own implementation, whichever way they're cached
+        if cls is FileCached and inspect.iscoroutinefunction(fn):
+            cls = AsyncFileCached
+        return super().__new__(cls)
+
+    def __init__(self, fn, cache_path=None, files_used=None, auto_purge=False, key_fn=None, storage='shelve',
+                 memory_max_entries=None, memory_max_bytes=None, max_entries=None, max_bytes=None, ttl=None,
+                 eviction='lru', files_check_interval=0, watch_files=False, mmap_threshold=None, compression=None,
+                 compression_threshold=1024, single_flight=False, fingerprint_code=False, write_behind=False,
+                 max_pending_writes=1000):
         """Caches function results to a file to save re-computation of highly expensive calls
 
         :param fn: The functions whose result should be cached
@@ -20,37 +97,369 @@ class FileCached:
         :type files_used: Iterable
         :param auto_purge: If True, deletes the file cache when this cache object passes out of scope
         :type: auto_purge: bool
+        :param key_fn: Called with the same arguments as ``fn`` to get the value that identifies a call; defaults to the
+         arguments themselves. Whatever it returns is digested into a stable key (see :func:`miniutils.caching.make_key`)
+        :type key_fn: function
+        :param storage: The backend that keeps cache entries: ``'shelve'`` (the default, not safe for concurrent use),
+         ``'sqlite'`` (safe to share between threads and processes), or a callable that takes the cache path and
+         returns a :class:`miniutils.caching.storage.Storage`
+        :type storage: str or function
+        :param memory_max_entries: If given, keeps up to this many recently used results in memory, in front of the
+         file cache, so that hits on them don't need to read and unpickle from disk
+        :type memory_max_entries: int
+        :param memory_max_bytes: If given, keeps recently used results in memory, in front of the file cache, up to this
+         total pickled size
+        :type memory_max_bytes: int
+        :param max_entries: If given, evicts entries from the file cache to keep at most this many
+        :type max_entries: int
+        :param max_bytes: If given, evicts entries from the file cache to keep their total size below this many bytes
+        :type max_bytes: int
+        :param ttl: If given, entries older than this many seconds are treated as misses and removed
+        :type ttl: float
+        :param eviction: Which entries to evict first when over ``max_entries`` or ``max_bytes``: ``'lru'`` (least
+         recently used), ``'lfu'`` (least frequently used), ``'cost'`` (least computation time saved per byte), or a
+         function from :class:`miniutils.caching.storage.EntryInfo` to a sort key, smallest first
+        :type eviction: str or function
+        :param files_check_interval: For how many seconds the modification times of ``files_used`` can be reused
+         before checking the files again; by default, they're checked on every call
+        :type files_check_interval: float
+        :param watch_files: If True, uses inotify (Linux only) to only check ``files_used`` again after one of them
+         might have changed, so that calls usually make no system calls to validate their entries
+        :type watch_files: bool
+        :param mmap_threshold: If given, ``numpy`` arrays and ``bytes`` results of at least this many bytes are saved
+         to their own files next to the cache, and hits on them return read-only memory-mapped views of those files
+         (a ``numpy.ndarray`` or ``memoryview``) instead of unpickling a copy
+        :type mmap_threshold: int
+        :param compression: If given, the codec used to compress entries: ``'zlib'``, ``'lzma'``, ``'bz2'``, or the
+         name of a codec added with :func:`miniutils.caching.compression.register_codec`. Each entry records its own
+         codec, so this can be changed without invalidating the existing cache
+        :type compression: str
+        :param compression_threshold: Entries smaller than this many bytes (before compression) are stored uncompressed
+        :type compression_threshold: int
+        :param single_flight: If True, when several threads or processes (sharing the cache path) miss on the same
+         arguments at once, only one of them runs the function and the others wait for and reuse its result
+        :type single_flight: bool
+        :param fingerprint_code: If True, entries are kept under a fingerprint of ``fn``'s code, so that changing the
+         function's code makes its old results miss (see :meth:`collect_stale_code` to delete them). If ``'deep'``, the
+         fingerprint also covers the functions and modules that ``fn`` references
+        :type fingerprint_code: bool or str
+        :param write_behind: If True, new entries are written to the file cache in batches by a background thread, so
+         that misses return without waiting on the disk. Entries waiting to be written are still served as hits, and
+         are written before the interpreter exits (or when :meth:`flush` is called, or the cache is used as a context
+         manager and exits)
+        :type write_behind: bool
+        :param max_pending_writes: With ``write_behind``, misses block once this many entries are waiting to be written
+        :type max_pending_writes: int
         """
+        if compression is not None and compression not in CODECS:
+            raise ValueError("Unknown compression codec '{}', expected one of {}".format(compression, sorted(CODECS)))
         self.__wrapped__ = fn
         self.path = cache_path or '.__cache_{}'.format(fn.__name__)
         self.files_used = tuple(sorted([os.path.abspath(os.path.expanduser(p)) for p in (files_used or [])]))
-        self._shelf = shelve.open(self.path)
+        self._dependencies = FileDependencies(self.files_used, files_check_interval, watch_files)
+        self._storage_factory = storage
+        self._write_behind = write_behind
+        self._storage = self._open_storage()
         self._auto_purge = auto_purge
+        self._key_fn = key_fn
+        if fingerprint_code:
+            self._code_prefix = 'code-{}:'.format(code_fingerprint(fn, deep=fingerprint_code == 'deep'))
+        else:
+            self._code_prefix = ''
+        if memory_max_entries is not None or memory_max_bytes is not None:
+            self._memory = _MemoryTier(memory_max_entries, memory_max_bytes)
+        else:
+            self._memory = None
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self._eviction = get_policy(eviction)
+        self._mmap_threshold = mmap_threshold
+        self._blob_dir = self.path + '.blobs'
+        self._compression = compression
+        self._compression_threshold = compression_threshold
+        self._flights = FileKeyLocks(self.path + '.lock') if single_flight else None
+        if write_behind:
+            self._writer = WriteBehind(self._storage, max_pending_writes, on_write=self._after_write)
+        else:
+            self._writer = None
+        self._last_expiry = time.time()
         self._hits = 0
         self._misses = 0
+        self._memory_hits = 0
+        self._memory_misses = 0
 
-    def __call__(self, *args, **kwargs):
-        key = ':'.join(self.files_used) + ':' + hex(hash((args, tuple(sorted(kwargs.items())))))
+    def _open_storage(self):
+        storage = open_storage(self._storage_factory, self.path)
+        if self._write_behind and not storage.thread_safe:
+            # The background writer needs to share it
+            storage = LockedStorage(storage)
+        return storage
+
+    def _make_key(self, args, kwargs):
+        if self._key_fn is not None:
+            return self._code_prefix + make_key(self.files_used, self._key_fn(*args, **kwargs))
+        return self._code_prefix + make_key(self.files_used, args, sorted(kwargs.items()))
+
+    @property
+    def _bounded(self):
+        return self._max_entries is not None or self._max_bytes is not None or self._ttl is not None
+
+    def _is_fresh(self, record):
+        created, file_update_times, _ = record
+        if self._ttl is not None and time.time() - created > self._ttl:
+            return False
+        return self._dependencies.unchanged_since(file_update_times)
+
+    def _lookup(self, key):
+        """Gets ``(True, result)`` if there's a valid cache entry for ``key``, else ``(False, None)``"""
+        found, result = self._lookup_memory(key)
+        if found:
+            return True, result
+        return self._lookup_storage(key)
 
-        if key in self._shelf:
-            file_update_times, result = self._shelf[key]
-            for file in self.files_used:
-                if not os.path.exists(file) or os.path.getmtime(file) > file_update_times[file]:
-                    break
+    def _lookup_storage(self, key):
+        try:
+            data = self._get_data(key)
+        except KeyError:
+            return False, None
+        return self._load(key, data)
+
+    def _get_data(self, key):
+        if self._writer is not None:
+            item = self._writer.pending.get(key)
+            if item is not None:
+                return item[1]
+        return self._storage.get(key)
+
+    def _lookup_memory(self, key):
+        if self._memory is None:
+            return False, None
+        try:
+            record = self._memory.get(key)
+        except KeyError:
+            self._memory_misses += 1
+            return False, None
+        if self._is_fresh(record):
+            found, result = self._result(record)
+            if found:
+                self._memory_hits += 1
+                return True, result
+        self._memory_misses += 1
+        self._memory.discard(key)
+        return False, None
+
+    def _load(self, key, data):
+        """Gets ``(True, result)`` from stored entry data if it's still valid, else ``(False, None)``"""
+        data = decompress(data)
+        record = pickle.loads(data)
+        if not self._is_fresh(record):
+            return False, None
+        found, result = self._result(record)
+        if not found:
+            return False, None
+        if self._bounded:
+            self._storage.touch(key)
+        if self._memory is not None:
+            self._memory.set(key, record, len(data))
+        return True, result
+
+    def _result(self, record):
+        result = record[2]
+        if isinstance(result, Blob):
+            try:
+                return True, load_blob(self._blob_dir, result)
+            except FileNotFoundError:
+                return False, None
+        return True, result
+
+    def _file_update_times(self):
+        file_update_times = self._dependencies.mtimes(force=True)
+        for file, modified in file_update_times.items():
+            if modified is None:
+                raise FileNotFoundError("Cached function depends on missing file '{}'".format(file))
+        return file_update_times
+
+    def _store(self, key, file_update_times, result, cost=0.0):
+        data = self._encode(key, file_update_times, result)
+        if self._writer is not None:
+            self._writer.put(key, data, cost)
+            return
+        self._storage.set(key, data, cost)
+        if self._bounded:
+            self._enforce_limits()
+
+    def _after_write(self):
+        if self._bounded:
+            self._enforce_limits()
+
+    def flush(self):
+        """Waits until all new entries have been written to the file cache (only needed with ``write_behind``)"""
+        if self._writer is not None:
+            self._writer.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
+
+    def _encode(self, key, file_update_times, result):
+        """Gets the data to store for an entry, and puts the entry in the memory tier"""
+        if self._mmap_threshold is not None:
+            blob = save_blob(self._blob_dir, key, result, self._mmap_threshold)
+            if blob is None:
+                delete_blobs(self._blob_dir, key)
             else:
+                result = blob
+        record = (time.time(), file_update_times, result)
+        data = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        if self._memory is not None:
+            self._memory.set(key, record, len(data))
+        return compress(data, self._compression, self._compression_threshold)
+
+    def _enforce_limits(self):
+        count, size = self._storage.stats()
+        over = ((self._max_entries is not None and count > self._max_entries) or
+                (self._max_bytes is not None and size > self._max_bytes))
+        # Expired entries are also swept up periodically, even when the cache is within its limits
+        if over or (self._ttl is not None and time.time() - self._last_expiry > self._ttl):
+            self.evict()
+
+    def evict(self):
+        """Removes expired entries from the file cache, then evicts entries according to the eviction policy until the
+        cache is within its limits. This happens automatically as entries are added, so it only needs to be called
+        explicitly to reclaim space from entries which expired while the cache was idle.
+
+        :return: The number of entries removed
+        """
+        now = time.time()
+        entries = self._storage.entries()
+        victims = []
+        if self._ttl is not None:
+            self._last_expiry = now
+            victims = [entry.key for entry in entries if now - entry.created > self._ttl]
+            entries = [entry for entry in entries if now - entry.created <= self._ttl]
+        victims.extend(select_victims(entries, self._eviction, self._max_entries, self._max_bytes))
+
+        for key in victims:
+            self._delete(key)
+        return len(victims)
+
+    def __call__(self, *args, **kwargs):
+        key = self._make_key(args, kwargs)
+
+        found, result = self._lookup(key)
+        if found:
+            self._hits += 1
+            return result
+
+        if self._flights is None:
+            return self._compute(key, args, kwargs)
+
+        with self._flights.hold(key):
+            # Whoever held the lock before us may have just computed this result
+            found, result = self._lookup(key)
+            if found:
                 self._hits += 1
                 return result
+            return self._compute(key, args, kwargs)
 
+    def _compute(self, key, args, kwargs):
         self._misses += 1
-        file_update_times = {file: os.path.getmtime(file) for file in self.files_used}
+        file_update_times = self._file_update_times()
+        start = time.perf_counter()
         result = self.__wrapped__(*args, **kwargs)
+        cost = time.perf_counter() - start
 
-        self._shelf[key] = (file_update_times, result)
+        self._store(key, file_update_times, result, cost)
 
         return result
 
+    def collect_stale_code(self, background=False):
+        """Deletes the entries computed by other versions of the function's code (see ``fingerprint_code``)
+
+        :param background: If True, do this on a background thread. Only do so with a storage backend that's safe
+         to use from several threads at once, such as ``'sqlite'``
+        :return: The number of entries deleted, or the background thread
+        """
+        if background:
+            thread = threading.Thread(target=self.collect_stale_code, name='FileCached collector', daemon=True)
+            thread.start()
+            return thread
+
+        current = self._code_prefix or None
+        stale = [key for key in self._storage.keys()
+                 if key.startswith('code-') and not (current and key.startswith(current))]
+        for key in stale:
+            self._delete(key)
+        return len(stale)
+
+    def _delete(self, key):
+        if self._writer is not None:
+            self._writer.discard(key)
+        self._storage.delete(key)
+        delete_blobs(self._blob_dir, key)
+        if self._memory is not None:
+            self._memory.discard(key)
+
+    def map(self, iterable, starmap=False, nprocs=None, batch_size=1000, verbose=True, **kwargs):
+        """Calls the cached function on every element of ``iterable``, computing the misses in parallel
+
+        All cache entries are looked up at once, then only the missing results (each distinct call only once) are
+        computed with :func:`miniutils.progress_bar.parallel_progbar`, and stored in batches.
+
+        :param iterable: The arguments to call the function with
+        :param starmap: If true, each element is a tuple of positional arguments rather than a single argument
+        :param nprocs: The number of processes to compute misses with (defaults to the number of cpu's)
+        :param batch_size: The number of new entries to write to the cache at once
+        :param verbose: Whether or not to print a progress bar while computing misses
+        :param kwargs: Any other keyword arguments to pass to ``parallel_progbar``
+        :return: A list of the function's results, in the same order as ``iterable``
+        """
+        arg_lists = [tuple(x) if starmap else (x,) for x in iterable]
+        keys = [self._make_key(args, {}) for args in arg_lists]
+
+        results = {}
+        for key in set(keys):
+            found, result = self._lookup_memory(key)
+            if found:
+                results[key] = result
+        pending = self._writer.pending if self._writer is not None else {}
+        stored = {key: pending[key][1] for key in set(keys) if key not in results and key in pending}
+        stored.update(self._storage.get_many([key for key in set(keys) if key not in results and key not in stored]))
+        for key, data in stored.items():
+            found, result = self._load(key, data)
+            if found:
+                results[key] = result
+
+        missing = OrderedDict((key, args) for key, args in zip(keys, arg_lists) if key not in results)
+        self._hits += len(keys) - len(missing)
+        self._misses += len(missing)
+        if missing:
+            file_update_times = self._file_update_times()
+            computed = parallel_progbar(partial(_timed_call, self.__wrapped__), list(missing.values()), nprocs=nprocs,
+                                        verbose=verbose, **kwargs)
+            entries = []
+            for key, (result, cost) in zip(missing, computed):
+                results[key] = result
+                entries.append((key, self._encode(key, file_update_times, result), cost))
+            if self._writer is not None:
+                for entry in entries:
+                    self._writer.put(*entry)
+            else:
+                for i in range(0, len(entries), batch_size):
+                    self._storage.set_many(entries[i:i + batch_size])
+                if self._bounded:
+                    self._enforce_limits()
+
+        return [results[key] for key in keys]
+
     def __del__(self):
-        if self._auto_purge:
+        writer = getattr(self, '_writer', None)
+        if writer is not None:
+            writer.close()
+        if getattr(self, '_auto_purge', False):
             self.cache_clear(create_new_shelf=False)
 
     def cache_clear(self, create_new_shelf=True):
@@ -60,23 +469,99 @@ class FileCached:
         for path in glob(os.path.dirname(self.path)):
             debug(path)
 
-        del self._shelf
+        if self._writer is not None:
+            # Let the writer finish with the storage before it's closed; its entries are about to be deleted anyway
+            self._writer.pending.clear()
+            self._writer.flush()
+        if self._memory is not None:
+            self._memory.clear()
+        self._storage.close()
+        del self._storage
+        if self._flights is not None:
+            self._flights.close()
         for path in glob(self.path + '*'):
-            os.remove(path)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
 
         debug("Clearing shelf: directory ends with the following files:")
         for path in glob(os.path.dirname(self.path)):
             debug(path)
 
         if create_new_shelf:
-            self._shelf = shelve.open(self.path)
+            self._storage = self._open_storage()
+            if self._writer is not None:
+                self._writer.storage = self._storage
+        elif self._writer is not None:
+            self._writer.close()
 
     def cache_info(self):
         """Gets information about this cache.
 
-        :return: A named tuple containing the number of cache ``hits`` and ``misses``
+        :return: A named tuple containing the number of cache ``hits`` and ``misses``, and how many lookups were
+         answered (``memory_hits``) or not (``memory_misses``) by the in-memory tier
+        """
+        return CacheInfo(self._hits, self._misses, self._memory_hits, self._memory_misses)
+
+
+class AsyncFileCached(FileCached):
+    def __init__(self, fn, *args, **kwargs):
+        """A version of :class:`miniutils.caching.FileCached` for coroutine functions, which is used automatically
+        when one is cached. Calling it returns an awaitable which gives the function's (cached) result.
+
+        Reading and writing the cache is done on a background thread, so that disk I/O doesn't block the event loop,
+        and concurrent calls with the same arguments await a single run of the function. Takes the same arguments as
+        :class:`miniutils.caching.FileCached`.
         """
-        return namedtuple('CacheInfo', ('hits', 'misses'))(self._hits, self._misses)
+        super().__init__(fn, *args, **kwargs)
+        # A single thread, so that storage backends never see concurrent use
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='FileCached')
+        self._in_flight = {}
+
+    async def __call__(self, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        key = self._make_key(args, kwargs)
+
+        found, result = self._lookup_memory(key)
+        if not found:
+            found, result = await loop.run_in_executor(self._executor, self._lookup_storage, key)
+        if found:
+            self._hits += 1
+            return result
+
+        task = self._in_flight.get(key)
+        if task is None or task.get_loop() is not loop:
+            task = self._in_flight[key] = loop.create_task(self._compute_async(key, args, kwargs))
+            task.add_done_callback(partial(self._finish_flight, key))
+        else:
+            self._hits += 1
+        # Shielded, so that one caller being cancelled doesn't cancel the computation for everyone else waiting on it
+        return await asyncio.shield(task)
+
+    def _finish_flight(self, key, task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+
+    async def _compute_async(self, key, args, kwargs):
+        loop = asyncio.get_running_loop()
+        self._misses += 1
+        file_update_times = await loop.run_in_executor(self._executor, self._file_update_times)
+        start = time.perf_counter()
+        result = await self.__wrapped__(*args, **kwargs)
+        cost = time.perf_counter() - start
+
+        await loop.run_in_executor(self._executor, self._store, key, file_update_times, result, cost)
+        return result
+
+    def map(self, *args, **kwargs):
+        raise NotImplementedError("Use asyncio.gather to call a cached coroutine function on many arguments")
+
+    def __del__(self):
+        executor = getattr(self, '_executor', None)
+        if executor is not None:
+            executor.shutdown(wait=False)
+        super().__del__()
 
 
 @optional_argument_decorator
@@ -89,6 +574,43 @@ def file_cached_decorator(*args, **kwargs):
     :type files_used: Iterable
     :param auto_purge: If True, deletes the file cache when this cache object passes out of scope
     :type: auto_purge: bool
+    :param key_fn: Called with the same arguments as the function to get the value that identifies a call
+    :type key_fn: function
+    :param storage: The backend that keeps cache entries: ``'shelve'``, ``'sqlite'``, or a storage factory
+    :type storage: str or function
+    :param memory_max_entries: If given, keeps up to this many recently used results in memory
+    :type memory_max_entries: int
+    :param memory_max_bytes: If given, keeps recently used results in memory up to this total pickled size
+    :type memory_max_bytes: int
+    :param max_entries: If given, evicts entries from the file cache to keep at most this many
+    :type max_entries: int
+    :param max_bytes: If given, evicts entries from the file cache to keep their total size below this many bytes
+    :type max_bytes: int
+    :param ttl: If given, entries older than this many seconds are treated as misses and removed
+    :type ttl: float
+    :param eviction: Which entries to evict first: ``'lru'``, ``'lfu'``, ``'cost'``, or a sort key function
+    :type eviction: str or function
+    :param files_check_interval: For how many seconds the modification times of ``files_used`` can be reused
+    :type files_check_interval: float
+    :param watch_files: If True, uses inotify (Linux only) to only check ``files_used`` after one of them changes
+    :type watch_files: bool
+    :param mmap_threshold: If given, large ``numpy`` arrays and ``bytes`` results are saved to their own files and
+     returned as read-only memory-mapped views
+    :type mmap_threshold: int
+    :param compression: If given, the codec used to compress entries: ``'zlib'``, ``'lzma'``, ``'bz2'``, or a
+     registered codec name
+    :type compression: str
+    :param compression_threshold: Entries smaller than this many bytes are stored uncompressed
+    :type compression_threshold: int
+    :param single_flight: If True, concurrent misses on the same arguments only run the function once
+    :type single_flight: bool
+    :param fingerprint_code: If True, entries are kept under a fingerprint of the function's code (or, if ``'deep'``,
+     also of the functions and modules it references), so that changing the code invalidates them
+    :type fingerprint_code: bool or str
+    :param write_behind: If True, new entries are written to the file cache in batches by a background thread
+    :type write_behind: bool
+    :param max_pending_writes: With ``write_behind``, misses block once this many entries are waiting to be written
+    :type max_pending_writes: int
     :return: A decorator for a function
     :rtype: function
     """
@@ -0,0 +1,149 @@
+import hashlib
+import inspect
+import pickle
+import struct
+import types
+
+
+def _length(n):
+    return struct.pack('>Q', n)
+
+
+def _digest(obj):
+    hasher = hashlib.blake2b(digest_size=32)
+    _feed(obj, hasher)
+    return hasher.digest()
+
+
+def _feed(obj, hasher):
+    """Feeds a canonical, type-tagged serialization of ``obj`` into ``hasher``
+
+    Unlike ``hash()``, the serialization doesn't depend on ``PYTHONHASHSEED``, so equal arguments produce equal keys in
+    every process. Unordered containers are serialized by sorting the digests of their elements.
+    """
+    # Check exact types first, so that bool isn't treated as int, and subclasses fall back to pickling
+    t = type(obj)
+    if obj is None:
+        hasher.update(b'N')
+    elif t is bool:
+        hasher.update(b'T' if obj else b'F')
+    elif t is int:
+        data = str(obj).encode()
+        hasher.update(b'i' + _length(len(data)) + data)
+    elif t is float:
+        hasher.update(b'f' + struct.pack('>d', obj))
+    elif t is str:
+        data = obj.encode('utf-8', 'surrogatepass')
+        hasher.update(b's' + _length(len(data)) + data)
+    elif t is bytes:
+        hasher.update(b'b' + _length(len(obj)) + obj)
+    elif t is tuple or t is list:
+        hasher.update((b't' if t is tuple else b'l') + _length(len(obj)))
+        for item in obj:
+            _feed(item, hasher)
+    elif t is dict:
+        hasher.update(b'd' + _length(len(obj)))
+        for item in sorted(_digest(k) + _digest(v) for k, v in obj.items()):
+            hasher.update(item)
+    elif t is set or t is frozenset:
+        hasher.update(b'S' + _length(len(obj)))
+        for item in sorted(_digest(v) for v in obj):
+            hasher.update(item)
+    else:
+        # Anything else is identified by its pickle, which is deterministic for most plain objects
+        data = pickle.dumps(obj, protocol=4)
+        hasher.update(b'p' + _length(len(data)) + data)
+
+
+def make_key(*parts):
+    """Builds a stable cache key from arbitrary (possibly nested) Python values
+
+    The key is a 256-bit BLAKE2 digest of a canonical serialization of the values, so it is identical across processes
+    and Python runs, and accidental collisions are not a practical concern (unlike the 64-bit ``hash()``).
+
+    :param parts: The values to identify, such as a function's positional arguments and sorted keyword arguments
+    :return: A hexadecimal key string
+    :rtype: str
+    """
+    hasher = hashlib.blake2b(digest_size=32)
+    _feed(parts, hasher)
+    return hasher.hexdigest()
+
+
+def _feed_value(value, hasher):
+    try:
+        _feed(value, hasher)
+    except Exception:
+        # Some values (e.g., locks) can't be serialized at all, so only their type can be taken into account
+        _feed('{}.{}'.format(type(value).__module__, type(value).__qualname__), hasher)
+
+
+def _feed_code(code, hasher):
+    hasher.update(code.co_code)
+    _feed((code.co_names, code.co_varnames, code.co_freevars, code.co_cellvars), hasher)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            _feed_code(const, hasher)
+        else:
+            _feed_value(const, hasher)
+
+
+def _global_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= _global_names(const)
+    return names
+
+
+def _feed_module(module, hasher):
+    _feed(module.__name__, hasher)
+    path = getattr(module, '__file__', None)
+    if path is not None:
+        try:
+            with open(path, 'rb') as f:
+                hasher.update(f.read())
+        except OSError:
+            pass
+
+
+def _feed_function(fn, hasher, deep, seen):
+    seen.add(fn)
+    _feed((fn.__module__, fn.__qualname__), hasher)
+    _feed_code(fn.__code__, hasher)
+    _feed_value(fn.__defaults__, hasher)
+    _feed_value(sorted((fn.__kwdefaults__ or {}).items()), hasher)
+    if not deep:
+        return
+
+    referenced = [fn.__globals__.get(name) for name in sorted(_global_names(fn.__code__))]
+    for cell in fn.__closure__ or ():
+        try:
+            referenced.append(cell.cell_contents)
+        except ValueError:  # The cell is empty
+            pass
+    for value in referenced:
+        if isinstance(value, types.FunctionType) and value not in seen:
+            _feed_function(value, hasher, deep, seen)
+        elif isinstance(value, types.ModuleType) and value not in seen:
+            seen.add(value)
+            _feed_module(value, hasher)
+
+
+def code_fingerprint(fn, deep=False):
+    """Gets a digest of a function's implementation, which changes whenever the function's code does
+
+    :param fn: The function to fingerprint
+    :param deep: If True, also include the functions it references (recursively, through globals and closures) and the
+     source files of the modules it references
+    :return: A hexadecimal digest
+    :rtype: str
+    """
+    fn = inspect.unwrap(fn)
+    hasher = hashlib.blake2b(digest_size=16)
+    if isinstance(fn, types.FunctionType):
+        _feed_function(fn, hasher, deep, set())
+    else:
+        # Builtins and other callables without bytecode are identified by name
+        _feed((getattr(fn, '__module__', None), getattr(fn, '__qualname__', repr(fn))), hasher)
+    return hasher.hexdigest()
@@ -0,0 +1,86 @@
+import os
+import threading
+import zlib
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: nocover
+    fcntl = None
+
+
+class KeyedLocks:
+    """Hands out one lock per key, only keeping the locks that are currently held or waited on"""
+
+    def __init__(self, lock_type=threading.Lock):
+        self._lock_type = lock_type
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    @contextmanager
+    def hold(self, key):
+        with self._guard:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [self._lock_type(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
+
+
+class FileKeyLocks:
+    """Advisory locks on keys, shared between processes through a lock file
+
+    Each key locks one byte of the file (chosen by a hash of the key), so unrelated keys rarely contend and the file
+    stays empty. POSIX locks belong to a whole process, so threads must also be kept apart, which is done with a
+    :class:`KeyedLocks`. Without ``fcntl`` (i.e., on Windows), only the threads of one process are kept apart.
+    """
+
+    _RANGE = 2 ** 30
+
+    def __init__(self, path):
+        self.path = path
+        self._threads = KeyedLocks()
+        self._fd = None
+        self._pid = None
+        self._fd_lock = threading.Lock()
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _file(self):
+        with self._fd_lock:
+            # Closing any descriptor of the file would release all of this process's locks on it, so keep just one
+            if self._fd is None or self._pid != os.getpid():
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+                self._pid = os.getpid()
+            return self._fd
+
+    @contextmanager
+    def hold(self, key):
+        with self._threads.hold(key):
+            if fcntl is None:
+                yield
+                return
+            fd = self._file()
+            offset = zlib.crc32(key.encode()) % self._RANGE
+            fcntl.lockf(fd, fcntl.LOCK_EX, 1, offset)
+            try:
+                yield
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN, 1, offset)
+
+    def close(self):
+        with self._fd_lock:
+            if self._fd is not None and self._pid == os.getpid():
+                os.close(self._fd)
+            self._fd = None
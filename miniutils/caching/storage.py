@@ -0,0 +1,354 @@
+import os
+import shelve
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+EntryInfo = namedtuple('EntryInfo', ('key', 'size', 'created', 'accessed', 'hits', 'cost'))
+EntryInfo.__doc__ = """Bookkeeping for one cache entry: its ``size`` in bytes, when it was ``created`` and last ``accessed`` (as
+``time.time()`` values), how many ``hits`` it has served, and the ``cost`` in seconds of computing it"""
+
+
+class Storage:
+    """The interface :class:`miniutils.caching.FileCached` uses to persist its entries
+
+    A storage maps string keys to ``bytes`` values, and keeps all of its files at paths starting with the ``path`` it's
+    given, so that the cache can be deleted by removing those files. Alongside each value, it keeps the bookkeeping
+    needed to choose entries for eviction (see :class:`miniutils.caching.storage.EntryInfo`).
+    """
+
+    #: Whether the storage can be used from several threads at once
+    thread_safe = False
+
+    def __init__(self, path):
+        self.path = path
+
+    def get(self, key):
+        """Gets the value stored for ``key``, raising ``KeyError`` if there isn't one"""
+        raise NotImplementedError()
+
+    def set(self, key, value, cost=0.0):
+        """Stores ``value`` for ``key``, along with the number of seconds it took to compute"""
+        raise NotImplementedError()
+
+    def get_many(self, keys):
+        """Gets a dictionary of the values stored for those of ``keys`` which are present"""
+        values = {}
+        for key in keys:
+            try:
+                values[key] = self.get(key)
+            except KeyError:
+                pass
+        return values
+
+    def set_many(self, items):
+        """Stores several ``(key, value, cost)`` entries at once"""
+        for key, value, cost in items:
+            self.set(key, value, cost)
+
+    def touch(self, key):
+        """Records a cache hit on ``key``"""
+        raise NotImplementedError()
+
+    def delete(self, key):
+        """Removes ``key``, if present"""
+        raise NotImplementedError()
+
+    def keys(self):
+        raise NotImplementedError()
+
+    def entries(self):
+        """Gets an :class:`miniutils.caching.storage.EntryInfo` for every entry"""
+        raise NotImplementedError()
+
+    def stats(self):
+        """Gets the number of entries and their total size in bytes"""
+        raise NotImplementedError()
+
+    def __contains__(self, key):
+        try:
+            self.get(key)
+        except KeyError:
+            return False
+        return True
+
+    def close(self):
+        pass
+
+
+class ShelveStorage(Storage):
+    """Keeps entries in a ``shelve`` database, which is opened once and held open. Not safe for concurrent use."""
+
+    # Entry bookkeeping is kept in the same shelf, under keys that can't collide with cache keys
+    _META_PREFIX = '\0meta:'
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._shelf = shelve.open(path)
+        self._stats = None
+
+    def get(self, key):
+        return self._shelf[key]
+
+    def set(self, key, value, cost=0.0):
+        meta_key = self._META_PREFIX + key
+        if self._stats is not None:
+            old = self._shelf.get(meta_key)
+            count, size = self._stats
+            if old is None:
+                self._stats = (count + 1, size + len(value))
+            else:
+                self._stats = (count, size - old[0] + len(value))
+        now = time.time()
+        self._shelf[key] = value
+        self._shelf[meta_key] = (len(value), now, now, 0, cost)
+
+    def set_many(self, items):
+        super().set_many(items)
+        self._shelf.sync()
+
+    def touch(self, key):
+        meta_key = self._META_PREFIX + key
+        try:
+            size, created, _, hits, cost = self._shelf[meta_key]
+        except KeyError:
+            return
+        self._shelf[meta_key] = (size, created, time.time(), hits + 1, cost)
+
+    def delete(self, key):
+        self._shelf.pop(key, None)
+        meta = self._shelf.pop(self._META_PREFIX + key, None)
+        if meta is not None and self._stats is not None:
+            count, size = self._stats
+            self._stats = (count - 1, size - meta[0])
+
+    def keys(self):
+        return [key for key in self._shelf.keys() if not key.startswith(self._META_PREFIX)]
+
+    def entries(self):
+        return [EntryInfo(key[len(self._META_PREFIX):], *self._shelf[key])
+                for key in list(self._shelf.keys()) if key.startswith(self._META_PREFIX)]
+
+    def stats(self):
+        # Counted once, then kept up to date as entries are added and removed
+        if self._stats is None:
+            entries = self.entries()
+            self._stats = (len(entries), sum(entry.size for entry in entries))
+        return self._stats
+
+    def __contains__(self, key):
+        return key in self._shelf
+
+    def close(self):
+        self._shelf.close()
+
+
+class SqliteStorage(Storage):
+    """Keeps entries in an SQLite database in write-ahead-log mode, so that any number of threads and processes can
+    share one cache: readers never block, and writers are serialized by SQLite without locking the whole file.
+
+    Connections are opened lazily, one per thread, and are re-opened after a fork. The entry count and total size are
+    maintained by triggers, so checking them doesn't need a table scan.
+    """
+
+    thread_safe = True
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY,
+            value BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            created REAL NOT NULL,
+            accessed REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            cost REAL NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS stats (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            count INTEGER NOT NULL,
+            size INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO stats (id, count, size) VALUES (0, 0, 0);
+        CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+            UPDATE stats SET count = count + 1, size = size + new.size;
+        END;
+        CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+            UPDATE stats SET count = count - 1, size = size - old.size;
+        END;
+        CREATE TRIGGER IF NOT EXISTS entries_resize AFTER UPDATE OF size ON entries BEGIN
+            UPDATE stats SET size = size - old.size + new.size;
+        END;
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._db_path = path + '.sqlite'
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._connection()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self._db_path, timeout=60, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(self._SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            with self._connections_lock:
+                self._connections.append((os.getpid(), conn))
+        return conn
+
+    def __getstate__(self):
+        return {'path': self.path, '_db_path': self._db_path}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+    def get(self, key):
+        row = self._connection().execute('SELECT value FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return row[0]
+
+    # An upsert rather than INSERT OR REPLACE, so that the triggers see an update instead of a silent delete
+    _UPSERT = ('INSERT INTO entries (key, value, size, created, accessed, hits, cost) VALUES (?, ?, ?, ?, ?, 0, ?) '
+               'ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size, '
+               'created = excluded.created, accessed = excluded.accessed, hits = 0, cost = excluded.cost')
+
+    # Stay well below SQLite's limit on the number of parameters in one statement
+    _BATCH = 500
+
+    def set(self, key, value, cost=0.0):
+        now = time.time()
+        self._connection().execute(self._UPSERT, (key, value, len(value), now, now, cost))
+
+    def get_many(self, keys):
+        conn = self._connection()
+        keys = list(keys)
+        values = {}
+        for i in range(0, len(keys), self._BATCH):
+            batch = keys[i:i + self._BATCH]
+            values.update(conn.execute('SELECT key, value FROM entries WHERE key IN ({})'
+                                       .format(', '.join('?' * len(batch))), batch))
+        return values
+
+    def set_many(self, items):
+        now = time.time()
+        conn = self._connection()
+        # One transaction for the whole batch, rather than one per entry
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(self._UPSERT, ((key, value, len(value), now, now, cost) for key, value, cost in items))
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def touch(self, key):
+        self._connection().execute('UPDATE entries SET accessed = ?, hits = hits + 1 WHERE key = ?',
+                                   (time.time(), key))
+
+    def delete(self, key):
+        self._connection().execute('DELETE FROM entries WHERE key = ?', (key,))
+
+    def keys(self):
+        return [key for key, in self._connection().execute('SELECT key FROM entries')]
+
+    def entries(self):
+        return [EntryInfo(*row) for row in self._connection().execute(
+            'SELECT key, size, created, accessed, hits, cost FROM entries')]
+
+    def stats(self):
+        return self._connection().execute('SELECT count, size FROM stats').fetchone()
+
+    def __contains__(self, key):
+        return self._connection().execute('SELECT 1 FROM entries WHERE key = ?', (key,)).fetchone() is not None
+
+    def close(self):
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for pid, conn in connections:
+            # Connections inherited through a fork belong to the parent process
+            if pid == os.getpid():
+                conn.close()
+
+
+class LockedStorage(Storage):
+    """Serializes all use of another storage with a lock, so that one which isn't thread-safe can be shared between
+    threads (at the cost of only using it from one thread at a time)"""
+
+    thread_safe = True
+
+    def __init__(self, storage):
+        super().__init__(storage.path)
+        self.storage = storage
+        self._lock = threading.RLock()
+
+    def get(self, key):
+        with self._lock:
+            return self.storage.get(key)
+
+    def set(self, key, value, cost=0.0):
+        with self._lock:
+            self.storage.set(key, value, cost)
+
+    def get_many(self, keys):
+        with self._lock:
+            return self.storage.get_many(keys)
+
+    def set_many(self, items):
+        with self._lock:
+            self.storage.set_many(items)
+
+    def touch(self, key):
+        with self._lock:
+            self.storage.touch(key)
+
+    def delete(self, key):
+        with self._lock:
+            self.storage.delete(key)
+
+    def keys(self):
+        with self._lock:
+            return self.storage.keys()
+
+    def entries(self):
+        with self._lock:
+            return self.storage.entries()
+
+    def stats(self):
+        with self._lock:
+            return self.storage.stats()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self.storage
+
+    def close(self):
+        with self._lock:
+            self.storage.close()
+
+
+STORAGES = {
+    'shelve': ShelveStorage,
+    'sqlite': SqliteStorage,
+}
+
+
+def open_storage(storage, path):
+    """Opens the storage backend named by ``storage`` (a key of ``STORAGES``), or built by calling ``storage(path)``"""
+    if isinstance(storage, str):
+        try:
+            storage = STORAGES[storage]
+        except KeyError:
+            raise ValueError("Unknown storage backend '{}', expected one of {}".format(storage, sorted(STORAGES)))
+    return storage(path)
@@ -0,0 +1,102 @@
+import atexit
+import queue
+import threading
+import weakref
+
+
+_writers = weakref.WeakSet()
+
+
+@atexit.register
+def _close_writers():
+    for writer in list(_writers):
+        writer.close()
+
+
+class WriteBehind:
+    def __init__(self, storage, max_pending=1000, batch_size=100, on_write=None):
+        """Writes entries to a storage backend from a background thread, in batches
+
+        Entries waiting to be written are kept in :attr:`pending`, so they can still be read. Once ``max_pending``
+        entries are waiting, adding another blocks until there's room. Whatever is pending is written before the
+        interpreter exits.
+
+        :param storage: The :class:`miniutils.caching.storage.Storage` to write to
+        :param max_pending: The maximum number of entries waiting to be written
+        :param batch_size: The maximum number of entries to write at once
+        :param on_write: A method to call (from the background thread) after each batch is written. It's only held weakly, so
+         that the writer doesn't keep its owner alive
+        """
+        self.storage = storage
+        self.batch_size = batch_size
+        self._on_write = weakref.WeakMethod(on_write) if on_write is not None else None
+        self.pending = {}
+        self._queue = queue.Queue(max_pending)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='FileCached writer', daemon=True)
+        self._thread.start()
+        _writers.add(self)
+
+    def put(self, key, value, cost=0.0):
+        """Queues ``value`` to be stored for ``key``"""
+        self._raise_error()
+        item = (key, value, cost)
+        self.pending[key] = item
+        self._queue.put(item)
+
+    def discard(self, key):
+        """Cancels any pending write for ``key``"""
+        self.pending.pop(key, None)
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            if items[0] is None:
+                self._queue.task_done()
+                return
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = items[-1] is None
+            if stop:
+                items.pop()
+
+            try:
+                # Skip entries which were discarded or replaced while waiting
+                batch = [item for item in items if self.pending.get(item[0]) is item]
+                if batch:
+                    self.storage.set_many(batch)
+                for item in batch:
+                    if self.pending.get(item[0]) is item:
+                        del self.pending[item[0]]
+                on_write = self._on_write() if batch and self._on_write is not None else None
+                if on_write is not None:
+                    on_write()
+            except Exception as ex:
+                self._error = ex
+            finally:
+                for _ in range(len(items) + stop):
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _raise_error(self):
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def flush(self):
+        """Waits until every pending entry has been written, re-raising any error from writing them"""
+        self._queue.join()
+        self._raise_error()
+
+    def close(self):
+        """Writes all pending entries and stops the background thread"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            # The owner may be garbage collected on the writer's own thread, which can't wait for itself
+            if threading.current_thread() is not self._thread:
+                self._thread.join()
+        self._raise_error()
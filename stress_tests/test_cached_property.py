@@ -1,5 +1,4 @@
 from unittest import TestCase
-from functools import lru_cache
 
 import math
 
@@ -61,7 +60,7 @@ class TestFileCachedCall(TestCase):
         n = 10000
 
         cached_f = FileCached(f, auto_purge=True)
-        lru_cached_f = lru_cache(maxsize=1)(cached_f)
+        lru_cached_f = FileCached(f, 'test_same_key_hybrid', memory_max_entries=1, auto_purge=True)
         toc = tic()
         for _ in progbar(n):
             f(5)
@@ -86,7 +85,8 @@ class TestFileCachedCall(TestCase):
         hybrid_ratio = 0.5
 
         cached_f = FileCached(f, auto_purge=True)
-        lru_cached_f = lru_cache(maxsize=int(1/hit_ratio * hybrid_ratio))(cached_f)
+        lru_cached_f = FileCached(f, 'test_random_keys_hybrid', memory_max_entries=int(1/hit_ratio * hybrid_ratio),
+                                  auto_purge=True)
 
         ixs = [randint(1, int(1/hit_ratio)) for _ in range(n)]
         toc = tic()
@@ -1,3 +1,4 @@
+import os
 from collections import defaultdict
 from unittest import TestCase
 from time import sleep
@@ -5,7 +6,13 @@ from time import sleep
 import numpy as np
 
 from miniutils import CachedProperty, LazyDictionary, FileCached, file_cached_decorator
+from miniutils.caching import make_key
 from miniutils.capture_output import captured_output
+from miniutils.progress_bar import parallel_progbar
+
+
+def _plus_one(x):
+    return x + 1
 
 
 class Matrix:
@@ -333,9 +340,9 @@ class TestCachedProperty(TestCase):
 
 class TestCachedFileCall(TestCase):
     def verify_from_cache(self, cacher, *args, **kwargs):
-        num_hits, num_misses = cacher.cache_info()
+        num_hits, num_misses = cacher.cache_info()[:2]
         result = cacher(*args, **kwargs)
-        new_hits, new_misses = cacher.cache_info()
+        new_hits, new_misses = cacher.cache_info()[:2]
         self.assertEqual(num_hits + num_misses + 1, new_hits + new_misses)
 
         if new_hits == num_hits + 1:
@@ -422,3 +429,341 @@ class TestCachedFileCall(TestCase):
         self.assertEqual(self.verify_from_cache(f, 1, 2), (True, 3))
         self.assertEqual(self.verify_from_cache(f, 3, 4), (True, 7))
         self.assertEqual(self.verify_from_cache(f, 5, 6), (True, 11))
+
+    def test_stable_keys(self):
+        import subprocess
+        import sys
+
+        code = "from miniutils.caching import make_key; print(make_key(('a', 1), {'b': {'c', 'd'}}, 2.0))"
+        keys = {subprocess.check_output([sys.executable, '-c', code], env=dict(os.environ, PYTHONHASHSEED=str(seed)))
+                for seed in range(3)}
+        self.assertEqual(len(keys), 1)
+
+        self.assertNotEqual(make_key(1), make_key(1.0))
+        self.assertNotEqual(make_key(True), make_key(1))
+        self.assertNotEqual(make_key(('ab', 'c')), make_key(('a', 'bc')))
+        self.assertEqual(make_key({'x': 1, 'y': 2}), make_key({'y': 2, 'x': 1}))
+
+    def test_key_fn(self):
+        @file_cached_decorator('test_key_fn', auto_purge=True, key_fn=lambda x, verbose=False: x)
+        def f(x, verbose=False):
+            return x + 1
+
+        self.assertEqual(self.verify_from_cache(f, 1), (False, 2))
+        self.assertEqual(self.verify_from_cache(f, 1, verbose=True), (True, 2))
+        self.assertEqual(self.verify_from_cache(f, 2, verbose=True), (False, 3))
+
+    def test_sqlite_storage(self):
+        f = FileCached(_plus_one, 'test_sqlite_storage', storage='sqlite', auto_purge=True)
+
+        self.assertEqual(self.verify_from_cache(f, 1), (False, 2))
+        self.assertEqual(self.verify_from_cache(f, 1), (True, 2))
+
+        # Worker processes share the same database, so their results are visible here
+        self.assertListEqual(parallel_progbar(f, [2, 3, 4] * 3, verbose=False), [3, 4, 5] * 3)
+        self.assertEqual(self.verify_from_cache(f, 3), (True, 4))
+
+        f.cache_clear()
+        self.assertEqual(self.verify_from_cache(f, 3), (False, 4))
+
+    def test_unknown_storage(self):
+        self.assertRaises(ValueError, FileCached, _plus_one, 'test_unknown_storage', storage='nope')
+
+    def test_memory_tier(self):
+        from tempfile import NamedTemporaryFile
+
+        with NamedTemporaryFile() as dep:
+            calls = []
+
+            def f(x):
+                calls.append(x)
+                return [x]
+
+            f = FileCached(f, 'test_memory_tier', files_used=[dep.name], memory_max_entries=2, auto_purge=True)
+
+            self.assertEqual(self.verify_from_cache(f, 1), (False, [1]))
+            self.assertIs(f(1), f(1))
+            self.assertEqual(f.cache_info().memory_hits, 2)
+
+            f(2)
+            f(3)  # Evicts 1 from memory, but it's still on disk
+            self.assertEqual(self.verify_from_cache(f, 1), (True, [1]))
+            self.assertEqual(f.cache_info().memory_misses, 4)
+            self.assertListEqual(calls, [1, 2, 3])
+
+            sleep(0.1)
+            dep.write(b'changed')
+            dep.flush()
+            self.assertEqual(self.verify_from_cache(f, 1), (False, [1]))
+            self.assertListEqual(calls, [1, 2, 3, 1])
+
+    def test_memory_tier_bytes(self):
+        f = FileCached(lambda n: 'x' * n, 'test_memory_tier_bytes', memory_max_bytes=1000, auto_purge=True)
+
+        f(10)
+        f(10)
+        self.assertEqual(f.cache_info().memory_hits, 1)
+        f(2000)  # Too large to keep in memory at all
+        f(2000)
+        self.assertEqual(f.cache_info(), (2, 2, 1, 3))
+
+    def test_max_entries(self):
+        for storage in ['shelve', 'sqlite']:
+            f = FileCached(_plus_one, 'test_max_entries_' + storage, storage=storage, max_entries=10, auto_purge=True)
+            for i in range(10):
+                f(i)
+            f(0)  # Keep 0 fresh, so the least recently used entry is now 1
+            sleep(0.01)
+            f(10)
+            self.assertLessEqual(f._storage.stats()[0], 10)
+            self.assertEqual(self.verify_from_cache(f, 0), (True, 1))
+            self.assertEqual(self.verify_from_cache(f, 1), (False, 2))
+
+    def test_max_bytes(self):
+        f = FileCached(lambda n: 'x' * n, 'test_max_bytes', storage='sqlite', max_bytes=5000, auto_purge=True)
+        for n in range(100, 2000, 100):
+            f(n)
+            self.assertLessEqual(f._storage.stats()[1], 5000)
+        self.assertEqual(self.verify_from_cache(f, 1900), (True, 'x' * 1900))
+        self.assertEqual(self.verify_from_cache(f, 100), (False, 'x' * 100))
+
+    def test_ttl(self):
+        f = FileCached(_plus_one, 'test_ttl', ttl=0.2, memory_max_entries=10, auto_purge=True)
+        self.assertEqual(self.verify_from_cache(f, 1), (False, 2))
+        self.assertEqual(self.verify_from_cache(f, 1), (True, 2))
+        sleep(0.3)
+        self.assertEqual(self.verify_from_cache(f, 1), (False, 2))
+        sleep(0.3)
+        f(2)  # Sweeps out the expired entry for 1
+        self.assertListEqual(f._storage.keys(), [f._make_key((2,), {})])
+
+    def test_eviction_policies(self):
+        from miniutils.caching.eviction import select_victims, get_policy
+        from miniutils.caching.storage import EntryInfo
+
+        entries = [EntryInfo('cheap', 100, 0, 3, 5, 0.001),
+                   EntryInfo('popular', 100, 0, 1, 50, 1.0),
+                   EntryInfo('recent', 100, 0, 9, 0, 1.0)]
+        self.assertListEqual(select_victims(entries, get_policy('lru'), max_entries=2, headroom=0), ['popular'])
+        self.assertListEqual(select_victims(entries, get_policy('lfu'), max_entries=2, headroom=0), ['recent'])
+        self.assertListEqual(select_victims(entries, get_policy('cost'), max_bytes=200, headroom=0), ['cheap'])
+        self.assertListEqual(select_victims(entries, get_policy('lru'), max_entries=3, headroom=0), [])
+        self.assertRaises(ValueError, get_policy, 'nope')
+
+    def test_files_check_interval(self):
+        from tempfile import NamedTemporaryFile
+
+        with NamedTemporaryFile() as dep:
+            f = FileCached(_plus_one, 'test_files_check_interval', files_used=[dep.name], files_check_interval=0.5,
+                           auto_purge=True)
+            self.assertEqual(self.verify_from_cache(f, 1), (False, 2))
+            sleep(0.1)
+            dep.write(b'changed')
+            dep.flush()
+            # Within the check interval, the change isn't noticed yet
+            self.assertEqual(self.verify_from_cache(f, 1), (True, 2))
+            sleep(0.5)
+            self.assertEqual(self.verify_from_cache(f, 1), (False, 2))
+
+    def test_watch_files(self):
+        import sys
+        from tempfile import TemporaryDirectory
+        from unittest import mock
+
+        if not sys.platform.startswith('linux'):
+            self.skipTest("inotify is only available on Linux")
+
+        with TemporaryDirectory() as tmp:
+            dep = os.path.join(tmp, 'dep')
+            with open(dep, 'w') as fh:
+                fh.write('1')
+
+            f = FileCached(_plus_one, os.path.join(tmp, 'cache'), files_used=[dep], watch_files=True, auto_purge=True)
+            self.assertEqual(self.verify_from_cache(f, 1), (False, 2))
+            with mock.patch('os.stat', side_effect=AssertionError("Hit shouldn't stat")):
+                self.assertEqual(self.verify_from_cache(f, 1), (True, 2))
+
+            sleep(0.1)
+            # Replace the file, rather than modifying it in place
+            with open(dep + '.new', 'w') as fh:
+                fh.write('2')
+            os.rename(dep + '.new', dep)
+            sleep(0.1)
+            self.assertEqual(self.verify_from_cache(f, 1), (False, 2))
+
+            os.remove(dep)
+            sleep(0.1)
+            self.assertRaises(FileNotFoundError, f, 1)
+            f._dependencies.close()
+
+    def test_mmap_results(self):
+        @file_cached_decorator('test_mmap_results', mmap_threshold=1000, memory_max_entries=10, auto_purge=True)
+        def f(n, as_bytes=False):
+            return b'x' * n if as_bytes else np.arange(n)
+
+        self.assertTrue(np.array_equal(self.verify_from_cache(f, 1000)[1], np.arange(1000)))
+        hit, result = self.verify_from_cache(f, 1000)
+        self.assertTrue(hit)
+        self.assertIsInstance(result, np.memmap)
+        self.assertFalse(result.flags.writeable)
+        self.assertTrue(np.array_equal(result, np.arange(1000)))
+
+        f(5000, as_bytes=True)
+        hit, result = self.verify_from_cache(f, 5000, as_bytes=True)
+        self.assertTrue(hit)
+        self.assertIsInstance(result, memoryview)
+        self.assertTrue(result.readonly)
+        self.assertEqual(bytes(result), b'x' * 5000)
+
+        # Small results are stored as usual
+        self.assertEqual(self.verify_from_cache(f, 10, as_bytes=True), (False, b'x' * 10))
+        self.assertEqual(self.verify_from_cache(f, 10, as_bytes=True), (True, b'x' * 10))
+        self.assertEqual(len(os.listdir('test_mmap_results.blobs')), 2)
+
+        f.cache_clear()
+        self.assertFalse(os.path.exists('test_mmap_results.blobs'))
+        self.assertEqual(self.verify_from_cache(f, 5000, as_bytes=True), (False, b'x' * 5000))
+
+    def test_compression(self):
+        from miniutils.caching.compression import register_codec
+
+        def f(n):
+            return 'x' * n
+
+        for codec in ['zlib', 'lzma', 'bz2']:
+            cached = FileCached(f, 'test_compression', compression=codec, storage='sqlite')
+            self.assertEqual(self.verify_from_cache(cached, 10000), (False, 'x' * 10000))
+            self.assertEqual(self.verify_from_cache(cached, 10000), (True, 'x' * 10000))
+            self.assertLess(cached._storage.stats()[1], 1000)
+            self.assertEqual(self.verify_from_cache(cached, 10), (False, 'x' * 10))
+            cached.cache_clear(create_new_shelf=False)
+
+        # Changing the codec leaves existing entries readable
+        register_codec('reversed', lambda data: data[::-1], lambda data: data[::-1])
+        FileCached(f, 'test_compression', compression='reversed', storage='sqlite')(5000)
+        cached = FileCached(f, 'test_compression', compression='zlib', storage='sqlite')
+        self.assertEqual(self.verify_from_cache(cached, 5000), (True, 'x' * 5000))
+        cached = FileCached(f, 'test_compression', storage='sqlite', auto_purge=True)
+        self.assertEqual(self.verify_from_cache(cached, 5000), (True, 'x' * 5000))
+
+        self.assertRaises(ValueError, FileCached, f, 'test_compression', compression='nope')
+        self.assertRaises(ValueError, register_codec, 'bad\0name', None, None)
+
+    def test_single_flight(self):
+        import threading
+        from tempfile import TemporaryDirectory
+
+        with TemporaryDirectory() as tmp:
+            log_path = os.path.join(tmp, 'calls')
+
+            def slow(x):
+                with open(log_path, 'a') as log:
+                    log.write('{}\n'.format(x))
+                sleep(0.2)
+                return x + 1
+
+            f = FileCached(slow, os.path.join(tmp, 'cache'), storage='sqlite', single_flight=True)
+
+            threads = [threading.Thread(target=f, args=(1,)) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertEqual(f.cache_info()[:2], (7, 1))
+
+            self.assertListEqual(parallel_progbar(f, [2, 3] * 4, nprocs=4, verbose=False), [3, 4] * 4)
+            with open(log_path) as log:
+                self.assertListEqual(sorted(log.read().split()), ['1', '2', '3'])
+            f.cache_clear(create_new_shelf=False)
+
+    def test_map(self):
+        for storage in ['shelve', 'sqlite']:
+            f = FileCached(_plus_one, 'test_map_' + storage, storage=storage, memory_max_entries=5, auto_purge=True)
+            f(3)
+            f(4)
+
+            self.assertListEqual(f.map([1, 2, 3, 4, 1, 2], verbose=False), [2, 3, 4, 5, 2, 3])
+            self.assertEqual(f.cache_info()[:2], (4, 4))
+            self.assertEqual(self.verify_from_cache(f, 1), (True, 2))
+
+            f = FileCached(lambda x, y: x * y, 'test_map_star_' + storage, storage=storage, auto_purge=True)
+            self.assertListEqual(f.map([(1, 2), (3, 4)] * 3000, starmap=True, batch_size=100, verbose=False),
+                                 [2, 12] * 3000)
+            self.assertEqual(self.verify_from_cache(f, 3, 4), (True, 12))
+
+    def test_async(self):
+        import asyncio
+        from miniutils.caching import AsyncFileCached
+
+        calls = []
+
+        @file_cached_decorator('test_async', auto_purge=True)
+        async def f(x):
+            calls.append(x)
+            await asyncio.sleep(0.1)
+            return x + 1
+
+        self.assertIsInstance(f, AsyncFileCached)
+
+        async def run():
+            self.assertEqual(await f(1), 2)
+            self.assertEqual(await f(1), 2)
+            self.assertListEqual(await asyncio.gather(*[f(2) for _ in range(5)]), [3] * 5)
+
+            # Cancelling one waiter doesn't cancel the shared computation
+            waiters = [asyncio.ensure_future(f(3)) for _ in range(2)]
+            await asyncio.sleep(0.01)
+            waiters[0].cancel()
+            self.assertEqual(await waiters[1], 4)
+
+        asyncio.run(run())
+        self.assertListEqual(calls, [1, 2, 3])
+        self.assertEqual(f.cache_info()[:2], (6, 3))
+
+    def test_fingerprint_code(self):
+        from miniutils.caching.keys import code_fingerprint
+
+        def helper(x):
+            return x + 1
+
+        def f(x):
+            return helper(x)
+
+        def g(x):
+            return helper(x) * 2
+
+        self.assertEqual(code_fingerprint(f), code_fingerprint(f))
+        self.assertNotEqual(code_fingerprint(f), code_fingerprint(g))
+
+        cached = FileCached(f, 'test_fingerprint_code', storage='sqlite', fingerprint_code='deep')
+        self.assertEqual(self.verify_from_cache(cached, 1), (False, 2))
+        self.assertEqual(self.verify_from_cache(cached, 1), (True, 2))
+        shallow = code_fingerprint(f)
+        deep = code_fingerprint(f, deep=True)
+
+        # A new version of the function (here, of a function it calls) misses on the old results
+        def helper(x):
+            return x + 10
+
+        self.assertEqual(code_fingerprint(f), shallow)
+        self.assertNotEqual(code_fingerprint(f, deep=True), deep)
+        cached = FileCached(f, 'test_fingerprint_code', storage='sqlite', fingerprint_code='deep', auto_purge=True)
+        self.assertEqual(self.verify_from_cache(cached, 1), (False, 11))
+        self.assertEqual(len(cached._storage.keys()), 2)
+        cached.collect_stale_code(background=True).join()
+        self.assertEqual(len(cached._storage.keys()), 1)
+        self.assertEqual(self.verify_from_cache(cached, 1), (True, 11))
+
+    def test_write_behind(self):
+        for storage in ('shelve', 'sqlite'):
+            with FileCached(lambda x: x * 2, 'test_write_behind', storage=storage, write_behind=True,
+                            max_pending_writes=4, max_entries=50, auto_purge=True) as cached:
+                # Results are served from the pending writes until they reach the storage
+                for i in range(20):
+                    self.assertEqual(self.verify_from_cache(cached, i), (False, 2 * i))
+                    self.assertEqual(self.verify_from_cache(cached, i), (True, 2 * i))
+                self.assertEqual(cached.map(range(25), nprocs=1, verbose=False), [2 * i for i in range(25)])
+                self.assertEqual(cached.cache_info()[:2], (40, 25))
+            self.assertFalse(cached._writer.pending)
+            self.assertEqual(cached._storage.stats()[0], 25)
+            del cached